@@ -1,39 +1,72 @@
 
 import os
-import subprocess
+import asyncio
 import json
+import queue
+import threading
+import time
+import uuid
 from datetime import datetime
-from flask import Flask, render_template, send_from_directory, Response, request, jsonify
+from quart import Quart, render_template, send_from_directory, Response, request, jsonify
 from dotenv import load_dotenv
 from osm_routing import get_graphhopper_usage
 from gemini_client import stream_gemini_evaluation, stream_openai_compatible_evaluation
-from data_processing import calculate_single_route_comparison
+from data_processing import run_random_comparison, run_manual_comparison, run_places_comparison
+import tasks
 
 load_dotenv()
 
-app = Flask(__name__)
+app = Quart(__name__)
 
 # Get API keys from environment variables
 GOOGLE_API_KEY = os.getenv("GOOGLE_ROADS_API_KEY")
 HERE_API_KEY = os.getenv("HERE_MAP_DATA_API_KEY")
 MAPBOX_TOKEN = os.getenv("MAPBOX_ACCESS_TOKEN")
 
-process = None
-ai_stream_generator = None
+# Active AI evaluation streams keyed by UUID. /evaluate-with-ai returns the
+# id and /ai-stream claims (pops) the generator, so concurrent evaluations
+# no longer clobber each other through a shared global.
+ai_streams = {}
+
+# Coalesce SSE frames so a burst of messages becomes one write instead of
+# one TCP packet per line (per-event flushing multiplies packets and CPU).
+SSE_BATCH_BYTES = 4096
+SSE_BATCH_SECONDS = 0.05
+
+def drain_sse_messages(msg_queue, first):
+    """Bundle queued messages into a single SSE payload.
+
+    Starts from `first` and keeps pulling until the queue stays empty for
+    SSE_BATCH_SECONDS or the payload reaches SSE_BATCH_BYTES. Returns the
+    payload string and whether the end-of-stream sentinel was consumed.
+    """
+    frames = [f"data: {first}\n\n"]
+    size = len(frames[0])
+    deadline = time.monotonic() + SSE_BATCH_SECONDS
+    ended = False
+    while size < SSE_BATCH_BYTES:
+        timeout = deadline - time.monotonic()
+        try:
+            line = msg_queue.get(timeout=timeout) if timeout > 0 else msg_queue.get_nowait()
+        except queue.Empty:
+            break
+        if line is None:
+            ended = True
+            break
+        frame = f"data: {line}\n\n"
+        frames.append(frame)
+        size += len(frame)
+    return ''.join(frames), ended
 
 @app.route('/')
-def index():
-    return render_template('index.html', mapbox_token=MAPBOX_TOKEN)
+async def index():
+    return await render_template('index.html', mapbox_token=MAPBOX_TOKEN)
 
 
 @app.route('/compare', methods=['POST'])
-def compare():
-    """Run the data processing script."""
-    global process
-    if process and process.poll() is None:
-        return {"status": "error", "output": "A comparison is already in progress."}
-
-    data = request.get_json()
+async def compare():
+    """Run a route comparison on the in-process task queue."""
+    data = await request.get_json()
     bbox = data.get('bbox')
     strategy = data.get('strategy', 'shortest')
     osm_provider = data.get('osm_provider', 'osrm') # Get the OSM provider
@@ -41,23 +74,15 @@ def compare():
     if not bbox or len(bbox) != 4:
         return {"status": "error", "output": "Invalid BBOX provided."}
 
-    cmd = [
-        'python', '-u', 'data_processing.py',
-        *map(str, bbox), # Unpack bbox elements
-        strategy,
-        osm_provider # Add osm_provider to the command
-    ]
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    return {"status": "success"}
-
-@app.route('/compare-places', methods=['POST'])
-def compare_places():
-    """Run the data processing script using Google Places POIs."""
-    global process
-    if process and process.poll() is None:
+    task = tasks.submit(run_random_comparison, tuple(map(float, bbox)), strategy, osm_provider)
+    if task is None:
         return {"status": "error", "output": "A comparison is already in progress."}
+    return {"status": "success", "task_id": task.id}
 
-    data = request.get_json()
+@app.route('/compare-places', methods=['POST'])
+async def compare_places():
+    """Run a route comparison using Google Places POIs."""
+    data = await request.get_json()
     bbox = data.get('bbox')
     strategy = data.get('strategy', 'shortest')
     osm_provider = data.get('osm_provider', 'osrm')
@@ -65,18 +90,15 @@ def compare_places():
     if not bbox or len(bbox) != 4:
         return {"status": "error", "output": "Invalid BBOX provided."}
 
-    cmd = ['python', '-u', 'data_processing.py', '--places', *map(str, bbox), strategy, osm_provider]
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    return {"status": "success"}
+    task = tasks.submit(run_places_comparison, tuple(map(float, bbox)), strategy, osm_provider)
+    if task is None:
+        return {"status": "error", "output": "A comparison is already in progress."}
+    return {"status": "success", "task_id": task.id}
 
 @app.route('/calculate-single-route', methods=['POST'])
-def calculate_single():
+async def calculate_single():
     """Calculate and return a single route comparison."""
-    global process
-    if process and process.poll() is None:
-        return jsonify({"status": "error", "output": "A comparison is already in progress."}), 400
-
-    data = request.get_json()
+    data = await request.get_json()
     origin = data.get('origin')
     destination = data.get('destination')
     strategy = data.get('strategy', 'shortest')
@@ -85,22 +107,34 @@ def calculate_single():
     if not origin or not destination or len(origin) != 2 or len(destination) != 2:
         return jsonify({"status": "error", "output": "Origin or destination missing."}), 400
 
-    cmd = [
-        'python', '-u', 'data_processing.py', '--manual',
-        str(origin[0]), str(origin[1]),
-        str(destination[0]), str(destination[1]),
-        strategy, osm_provider
-    ]
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-    return jsonify({"status": "success"})
+    task = tasks.submit(run_manual_comparison, tuple(origin), tuple(destination), strategy, osm_provider)
+    if task is None:
+        return jsonify({"status": "error", "output": "A comparison is already in progress."}), 400
+    return jsonify({"status": "success", "task_id": task.id})
+
+STATS_FILE = 'data/stats.json'
+_stats_cache = {'mtime': None, 'data': None}
+
+def load_stats():
+    """Load stats.json, reusing the parsed dict until the file changes.
+
+    /evaluate-with-ai is called repeatedly against the same comparison run;
+    the stat() check skips re-reading and re-parsing the file unless a new
+    comparison has rewritten it.
+    """
+    mtime = os.stat(STATS_FILE).st_mtime_ns
+    if mtime != _stats_cache['mtime']:
+        with open(STATS_FILE, 'r') as f:
+            _stats_cache['data'] = json.load(f)
+        _stats_cache['mtime'] = mtime
+    return _stats_cache['data']
 
 @app.route('/evaluate-with-ai', methods=['POST'])
-def evaluate_with_ai():
+async def evaluate_with_ai():
     """
     Starts a streaming AI evaluation for a given route pair.
     """
-    global ai_stream_generator
-    data = request.get_json()
+    data = await request.get_json()
     user_prompt = data.get('prompt')
     route_id = data.get('route_id')
     ai_provider = data.get('ai_provider', 'deepseek') # Default to deepseek
@@ -109,68 +143,158 @@ def evaluate_with_ai():
         return jsonify({"status": "error", "output": "Prompt or route_id missing."}), 400
 
     try:
-        with open('data/stats.json', 'r') as f:
-            all_stats = json.load(f)
-        
+        all_stats = load_stats()
+
         route_stats = all_stats.get(str(route_id))
         if not route_stats:
             return jsonify({"status": "error", "output": f"No data found for route ID {route_id}."}), 404
 
         # Choose the correct generator based on the provider
         if ai_provider == 'gemini':
-            ai_stream_generator = stream_gemini_evaluation(route_stats, user_prompt)
+            generator = stream_gemini_evaluation(route_stats, user_prompt)
         else:
-            ai_stream_generator = stream_openai_compatible_evaluation(ai_provider, route_stats, user_prompt)
-            
-        return jsonify({"status": "success"})
+            generator = stream_openai_compatible_evaluation(ai_provider, route_stats, user_prompt)
+
+        stream_id = uuid.uuid4().hex
+        ai_streams[stream_id] = generator
+        return jsonify({"status": "success", "stream_id": stream_id})
 
     except (FileNotFoundError, json.JSONDecodeError):
         return jsonify({"status": "error", "output": "Statistics data not found. Please run a comparison first."}), 404
     except Exception as e:
         return jsonify({"status": "error", "output": str(e)}), 500
 
+def next_task_message(task):
+    """Block for the next progress line; None means end of stream.
+
+    Uses timed gets so a connection to an already-finished task (second
+    tab, reconnect after completion) observes task.done instead of parking
+    an executor thread forever on an empty queue whose end-of-stream
+    sentinel was already consumed.
+    """
+    while True:
+        try:
+            return task.messages.get(timeout=0.5)
+        except queue.Empty:
+            if task.done.is_set():
+                return None
+
 @app.route('/progress')
-def progress():
-    """Stream the output of the data processing script."""
-    def generate():
-        global process
-        if not process:
+async def progress():
+    """Stream the progress messages of the running comparison task."""
+    task_id = request.args.get('task_id')
+    task = tasks.get(task_id) if task_id else tasks.latest()
+
+    async def generate():
+        if not task:
             return
-        # Stream output line by line
-        with process.stdout:
-            for line in iter(process.stdout.readline, ''):
-                yield f"data: {line}\n\n"
-        process.wait() # Wait for the process to finish
+        # Stream messages until the worker publishes the end-of-stream
+        # sentinel. The blocking queue reads run on a thread so one event
+        # loop can multiplex many SSE clients; messages that arrive close
+        # together are coalesced into a single write.
+        while True:
+            line = await asyncio.to_thread(next_task_message, task)
+            if line is None:
+                break
+            payload, ended = await asyncio.to_thread(drain_sse_messages, task.messages, line)
+            yield payload
+            if ended:
+                break
         yield 'event: close\ndata: Connection closed by server\n\n'
-        process = None
 
-    return Response(generate(), mimetype='text/event-stream')
+    response = Response(generate(), mimetype='text/event-stream')
+    # Quart caps response bodies at RESPONSE_TIMEOUT (60s by default), which
+    # would truncate the stream of any longer comparison run mid-flight.
+    response.timeout = None
+    return response
+
+# Cap on chunks buffered between the LLM iterator and the SSE writer. When a
+# slow client stops reading, the producer blocks on put() instead of letting
+# tokens pile up in memory without bound.
+AI_STREAM_QUEUE_SIZE = 64
 
 @app.route('/ai-stream')
-def ai_stream():
+async def ai_stream():
     """Streams the AI evaluation response."""
-    def generate_ai_response():
-        global ai_stream_generator
-        if not ai_stream_generator:
+    stream_id = request.args.get('stream_id')
+    # Claim the generator so it is consumed at most once
+    generator = ai_streams.pop(stream_id, None)
+
+    async def generate_ai_response():
+        if not generator:
             return
-        
-        for chunk in ai_stream_generator:
-            yield f"data: {json.dumps({'text': chunk})}\n\n"
-        ai_stream_generator = None # Clear after use
 
-    return Response(generate_ai_response(), mimetype='text/event-stream')
+        # The AI SDK iterators are synchronous; run them on a producer thread
+        # feeding a bounded queue so slow responses neither block the event
+        # loop nor accumulate unbounded output for a slow client.
+        chunks = queue.Queue(maxsize=AI_STREAM_QUEUE_SIZE)
+        # Set when the client goes away. Both sides poll it in their timed
+        # queue operations so neither the producer (blocked on a full queue)
+        # nor the reader thread (blocked on an empty one) is parked forever
+        # after a disconnect.
+        abandoned = threading.Event()
+
+        def put_chunk(item):
+            """Timed put; gives up once the stream has been abandoned."""
+            while not abandoned.is_set():
+                try:
+                    chunks.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def next_chunk():
+            """Timed get; reports end of stream once it has been abandoned."""
+            while not abandoned.is_set():
+                try:
+                    return chunks.get(timeout=0.5)
+                except queue.Empty:
+                    pass
+            return None
+
+        def produce():
+            try:
+                for chunk in generator:
+                    if not put_chunk(json.dumps({'text': chunk})):
+                        break
+            finally:
+                # Close the LLM HTTP stream from the thread that iterates it
+                generator.close()
+                put_chunk(None)
+
+        threading.Thread(target=produce, name='ai-stream-producer', daemon=True).start()
+
+        try:
+            while True:
+                line = await asyncio.to_thread(next_chunk)
+                if line is None:
+                    break
+                payload, ended = await asyncio.to_thread(drain_sse_messages, chunks, line)
+                yield payload
+                if ended:
+                    break
+        finally:
+            # Runs on normal completion and when Quart cancels the generator
+            # on client disconnect; unblocks the producer either way.
+            abandoned.set()
+
+    response = Response(generate_ai_response(), mimetype='text/event-stream')
+    # Long AI evaluations outlive Quart's 60s default response timeout
+    response.timeout = None
+    return response
 
 @app.route('/graphhopper-usage')
-def graphhopper_usage():
+async def graphhopper_usage():
     """Return the GraphHopper API usage for the current day."""
     count = get_graphhopper_usage()
     return jsonify({'count': count})
 
 
 @app.route('/data/<path:filename>')
-def serve_data(filename):
+async def serve_data(filename):
     """Serve data files."""
-    return send_from_directory('data', filename)
+    return await send_from_directory('data', filename)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,13 +1,21 @@
+import os
 import sys
 import json
+import asyncio
+import functools
+import http_session
+import orjson
 import geopandas as gpd
 import numpy as np
-from shapely.geometry import LineString, Point
-from concurrent.futures import ThreadPoolExecutor
-from google_routing import get_google_route
-from here_routing import get_here_route, snap_to_road_here
-from osm_routing import get_osm_route, get_graphhopper_route, snap_to_road_osrm
+import shapely
+from shapely.geometry import LineString, Point, mapping
+from pyproj import Transformer
+from google_routing import get_google_route_async
+from here_routing import get_here_route_async
+from osm_routing import get_osm_route_async, get_graphhopper_route_async, snap_points_osrm
+from geo_utils import haversine_distance
 from logger_config import setup_logger
+import routing_cache
 import logging
 
 # Default Bounding box for Stuttgart-Weilimdorf
@@ -19,72 +27,265 @@ BUFFER_METERS = 30 # Buffer size in meters for overlap calculation
 # Use a projected CRS for accurate length calculations (UTM zone 32N for Stuttgart)
 CRS_PROJ = "EPSG:32632"
 
+# One PROJ pipeline for the whole process: building a Transformer costs
+# milliseconds, so reuse it instead of letting each to_crs() call create one.
+TRANSFORMER = Transformer.from_crs("EPSG:4326", CRS_PROJ, always_xy=True)
+
+@functools.lru_cache(maxsize=256)
+def _project_wkb_to_utm(wkb):
+    line = shapely.from_wkb(wkb)
+    xs, ys = TRANSFORMER.transform(*np.asarray(line.coords).T)
+    return LineString(np.column_stack([xs, ys]))
+
+def project_to_utm(line):
+    """Project a WGS84 LineString to the metric CRS via the cached transformer.
+
+    Projections are memoized on the geometry's WKB: providers frequently
+    return identical polylines for short routes, and the Google base route
+    is projected again whenever a comparison is re-run over the same pair.
+    """
+    return _project_wkb_to_utm(line.wkb)
+
+def project_all_to_utm(lines):
+    """Project several WGS84 LineStrings in one vectorized transformer call.
+
+    Concatenates the coordinates of all lines so pyproj crosses into C once
+    for the whole group, then splits the projected array back into
+    LineStrings. None entries pass through unchanged.
+    """
+    present = [line for line in lines if line]
+    if not present:
+        return list(lines)
+    coords = [np.asarray(line.coords) for line in present]
+    stacked = np.concatenate(coords)
+    xs, ys = TRANSFORMER.transform(stacked[:, 0], stacked[:, 1])
+    projected = np.column_stack([xs, ys])
+    splits = np.cumsum([len(c) for c in coords])[:-1]
+    pieces = iter(np.split(projected, splits))
+    return [LineString(next(pieces)) if line else None for line in lines]
+
 # Setup logger
 setup_logger()
 
-# Custom JSON encoder to handle GeoDataFrame
-# Moved to the top level to be accessible on import.
-class GeoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, gpd.GeoDataFrame):
-            return json.loads(obj.to_json())
-        return json.JSONEncoder.default(self, obj)
+# orjson options for all frontend-facing dumps: numpy scalars appear in
+# route properties and stats are keyed by integer route ids.
+_ORJSON_OPTS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def _json_default(obj):
+    """Fallback for orjson: GeoDataFrames serialize as FeatureCollections."""
+    if isinstance(obj, gpd.GeoDataFrame):
+        return obj.__geo_interface__
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_json(obj):
+    """Serialize to a compact JSON string with orjson (GeoDataFrame-aware)."""
+    return orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS).decode()
 
 def generate_random_points_in_bbox(bbox, num_points):
-    """Generate a list of random points within a bounding box."""
+    """Generate random points within a bounding box as a (num_points, 2) array."""
     min_lon, min_lat, max_lon, max_lat = bbox
     lons = np.random.uniform(min_lon, max_lon, num_points)
     lats = np.random.uniform(min_lat, max_lat, num_points)
-    return list(zip(lons, lats))
-
-def haversine_distance(p1, p2):
-    """Calculate the distance between two (lon, lat) points in kilometers."""
-    lon1, lat1 = p1
-    lon2, lat2 = p2
-    R = 6371  # Earth radius in kilometers
-
-    dlat = np.radians(lat2 - lat1)
-    dlon = np.radians(lon2 - lon1)
-    a = (np.sin(dlat / 2) * np.sin(dlat / 2) +
-         np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) *
-         np.sin(dlon / 2) * np.sin(dlon / 2))
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
+    # Keep the coordinates in the ndarray instead of materializing Python
+    # tuples; callers index rows (lon, lat) directly.
+    return np.column_stack([lons, lats])
+
+def generate_od_pairs(bbox, num_pairs, min_separation=1e-4):
+    """Draw origin/destination pairs as two (num_pairs, 2) arrays.
+
+    One vectorized sample replaces the old per-pair loop, and degenerate
+    pairs (origin ~ destination, within ~10m in degrees) are redrawn via
+    boolean masking - the invariant the loop claimed but never checked.
+
+    Raises ValueError if the bbox is too small to separate origins from
+    destinations (its diagonal is below min_separation) or if redrawing
+    fails to produce separated pairs.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if np.hypot(max_lon - min_lon, max_lat - min_lat) < min_separation:
+        raise ValueError("Bounding box is too small to generate distinct OD pairs.")
+    rng = np.random.default_rng()
+    low, high = (min_lon, min_lat), (max_lon, max_lat)
+    pts = rng.uniform(low, high, (num_pairs, 2, 2))
+    bad = np.linalg.norm(pts[:, 0] - pts[:, 1], axis=1) < min_separation
+    attempts = 0
+    while bad.any():
+        attempts += 1
+        if attempts > 100:
+            raise ValueError("Could not generate sufficiently separated OD pairs in this bounding box.")
+        pts[bad] = rng.uniform(low, high, (int(bad.sum()), 2, 2))
+        bad = np.linalg.norm(pts[:, 0] - pts[:, 1], axis=1) < min_separation
+    return pts[:, 0], pts[:, 1]
+
+# Optional sink for progress/result lines. When the processing code runs
+# in-process (dispatched by tasks.py) the worker installs a sink that feeds
+# the SSE channel; when run as a script the lines go to stdout as before.
+_progress_sink = None
+
+def set_progress_sink(sink):
+    """Route progress/result lines to `sink` instead of stdout (server mode)."""
+    global _progress_sink
+    _progress_sink = sink
+
+def emit_line(line):
+    """Send a raw line to the frontend via the active sink or stdout."""
+    if _progress_sink is not None:
+        _progress_sink(line)
+    else:
+        print(line)
+        sys.stdout.flush()
 
 def log_progress(current, total, message):
     """Logs progress as a JSON object for the frontend to parse."""
     progress_percentage = int((current / total) * 100)
     # Use a specific format that the frontend can distinguish from regular logs
     progress_log = {"type": "progress", "progress": progress_percentage, "message": message}
-    # Print directly to stdout to ensure it's always sent, regardless of log level
-    print(json.dumps(progress_log))
-    sys.stdout.flush()
-
-def calculate_coverage(base_route_gdf_proj, other_route, buffer_size):
-    """Calculates the coverage percentage of other_route on a buffered base_route."""
-    if not other_route:
-        return 0
-
-    base_length = base_route_gdf_proj.length.sum()
+    # Emit directly to ensure it's always sent, regardless of log level
+    emit_line(dumps_json(progress_log))
+
+# The coverage corridor is a tolerance band, not an exact offset: flat caps,
+# mitred joins and 2 segments per quadrant cut the polygon vertex count
+# several-fold versus the default round geometry with 16 arc segments,
+# which is what the GEOS intersection cost scales with.
+_BUFFER_STYLE = {'quad_segs': 2, 'cap_style': 'flat', 'join_style': 'mitre'}
+
+def prepare_coverage_base(base_route_proj, buffer_size):
+    """Buffer the projected base route once so it can be reused across
+    coverage calculations against multiple candidate routes."""
+    base_length = base_route_proj.length
+    base_buffered = base_route_proj.buffer(buffer_size, **_BUFFER_STYLE)
+    return base_buffered, base_length
+
+def calculate_coverages(base_route_proj, other_routes, buffer_size):
+    """Coverage percentage of each candidate route on the buffered base route.
+
+    All candidates are clipped against the corridor in one vectorized
+    shapely 2.x call (the GEOS loop runs in C, no per-route Python dispatch).
+    Returns percentages aligned with other_routes; missing routes score 0.
+    """
+    base_buffered, base_length = prepare_coverage_base(base_route_proj, buffer_size)
+    coverages = [0.0] * len(other_routes)
     if base_length == 0:
-        return 0
-
-    base_buffered = base_route_gdf_proj.buffer(buffer_size).union_all()
-    other_gdf_proj = gpd.GeoDataFrame([{'geometry': other_route}], crs="EPSG:4326").to_crs(CRS_PROJ)
-    intersection_length = base_buffered.intersection(other_gdf_proj.union_all()).length
-    return (intersection_length / base_length) * 100
+        return coverages
+
+    present = [idx for idx, route in enumerate(other_routes) if route]
+    if not present:
+        return coverages
+
+    # One transformer call covers every candidate of this comparison
+    projected = project_all_to_utm([other_routes[idx] for idx in present])
+    candidates = np.array(projected, dtype=object)
+    # Preparing the corridor builds a GEOS edge index, giving the intersects
+    # screen a fast path; only candidates that actually touch the corridor
+    # pay for the full overlay that computes the clipped length.
+    shapely.prepare(base_buffered)
+    hits = shapely.intersects(base_buffered, candidates)
+    if hits.any():
+        lengths = shapely.length(shapely.intersection(base_buffered, candidates[hits]))
+        hit_indices = [idx for idx, hit in zip(present, hits) if hit]
+        for idx, intersection_length in zip(hit_indices, lengths):
+            coverages[idx] = (intersection_length / base_length) * 100
+    return coverages
+
+def calculate_coverages_batch(base_routes, candidate_lists, buffer_size):
+    """Coverage percentages for many base routes against their candidates.
+
+    Projects every geometry of the run in one transformer call, buffers all
+    base routes in one vectorized shapely call, and clips all base/candidate
+    pairings with a single intersects screen + intersection overlay - one
+    GEOS pass for the whole run instead of one calculate_coverages round per
+    base route. candidate_lists[i] holds the candidates of base_routes[i];
+    returns a list of per-base coverage lists with missing candidates at 0.
+    """
+    if not base_routes:
+        return []
+    counts = [len(group) for group in candidate_lists]
+    flat_candidates = [route for group in candidate_lists for route in group]
+    projected = project_all_to_utm(list(base_routes) + flat_candidates)
+    bases_arr = np.array(projected[:len(base_routes)], dtype=object)
+    cands_proj = projected[len(base_routes):]
+
+    buffers = shapely.buffer(bases_arr, buffer_size, **_BUFFER_STYLE)
+    base_lengths = shapely.length(bases_arr)
+
+    coverages = [[0.0] * n for n in counts]
+    # Pair each candidate with the buffer of its own base route
+    pair_base = np.repeat(np.arange(len(base_routes)), counts)
+    present = np.flatnonzero([route is not None for route in cands_proj])
+    if present.size == 0:
+        return coverages
+
+    cand_arr = np.array(cands_proj, dtype=object)[present]
+    buf_arr = buffers[pair_base[present]]
+    shapely.prepare(buf_arr)
+    hits = shapely.intersects(buf_arr, cand_arr)
+    lengths = np.zeros(len(cand_arr))
+    if hits.any():
+        lengths[hits] = shapely.length(shapely.intersection(buf_arr[hits], cand_arr[hits]))
+
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    for pos, length in zip(present, lengths):
+        base_idx = pair_base[pos]
+        if base_lengths[base_idx] > 0:
+            coverages[base_idx][pos - offsets[base_idx]] = (length / base_lengths[base_idx]) * 100
+    return coverages
 
 def save_gdf_to_geojson(data, filename):
-    """Helper function to create and save a GeoDataFrame."""
+    """Write rows of {'geometry': ..., props...} as a GeoJSON FeatureCollection.
+
+    Serializes directly with json.dump instead of GeoPandas' to_file, which
+    routes a handful of features through Fiona/OGR (driver negotiation, CRS
+    re-parse, per-feature writes) at many times the cost. Instruction lists
+    are embedded as native JSON arrays. An empty input still overwrites the
+    old file with an empty collection.
+    """
     full_path = f"data/{filename}"
-    if data:
-        gdf = gpd.GeoDataFrame(data, crs="EPSG:4326", geometry='geometry')
-        gdf.to_file(full_path, driver='GeoJSON')
+    features = [{
+        "type": "Feature",
+        "geometry": mapping(row['geometry']),
+        "properties": {k: v for k, v in row.items() if k != 'geometry'}
+    } for row in data]
+    with open(full_path, 'wb') as f:
+        f.write(orjson.dumps({"type": "FeatureCollection", "features": features},
+                             option=_ORJSON_OPTS))
+
+def route_record(route, details, route_id):
+    """Build a result row for one provider route."""
+    return {
+        'geometry': route, 'route_id': route_id,
+        'distance': details.get('distance'), 'duration': details.get('duration'),
+        'instructions': details.get('instructions', [])
+    }
+
+def build_routing_options(strategy):
+    """Per-provider routing options for a strategy."""
+    here_opts = {}
+    google_opts = {'strategy': strategy}
+    osm_opts = {'strategy': strategy}
+    if strategy == 'shortest':
+        here_opts = {'routingMode': 'short'}
+    return google_opts, here_opts, osm_opts
+
+async def fetch_route_set(session, origin, destination, strategy, osm_provider):
+    """Fetch the Google/HERE/OSM routes for one OD pair concurrently.
+
+    Returns three (route, details) pairs. Option dicts are copied per call
+    because the providers pop private keys out of them.
+    """
+    google_opts, here_opts, osm_opts = build_routing_options(strategy)
+    if osm_provider == 'graphhopper':
+        osm_coro = routing_cache.fetch_cached_async(
+            get_graphhopper_route_async, 'graphhopper', session, origin, destination, dict(osm_opts))
     else:
-        # If there's no data, create an empty GeoJSON file to overwrite the old one.
-        empty_geojson = {"type": "FeatureCollection", "features": []}
-        with open(full_path, 'w') as f:
-            json.dump(empty_geojson, f)
+        osm_coro = routing_cache.fetch_cached_async(
+            get_osm_route_async, 'osrm', session, origin, destination, dict(osm_opts))
+    return await asyncio.gather(
+        routing_cache.fetch_cached_async(
+            get_google_route_async, 'google', session, origin, destination, dict(google_opts)),
+        routing_cache.fetch_cached_async(
+            get_here_route_async, 'here', session, origin, destination, dict(here_opts)),
+        osm_coro,
+    )
 
 def calculate_single_route_comparison(origin, destination, strategy, osm_provider):
     """
@@ -95,27 +296,15 @@ def calculate_single_route_comparison(origin, destination, strategy, osm_provide
     google_routes, here_routes, osm_routes = [], [], []
     stats = {}
 
-    # --- Define routing options based on strategy ---
-    here_opts = {}
-    google_opts = {'strategy': strategy}
-    osm_opts = {'strategy': strategy}
-    if strategy == 'shortest':
-        here_opts = {'routingMode': 'short'}
+    async def fetch():
+        async with http_session.make_async_session() as session:
+            return await fetch_route_set(session, origin, destination, strategy, osm_provider)
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        logging.debug("Submitting routing tasks to thread pool...")
-        future_google = executor.submit(get_google_route, origin, destination, google_opts)
-        future_here = executor.submit(get_here_route, origin, destination, here_opts)
-        if osm_provider == 'graphhopper':
-            future_osm = executor.submit(get_graphhopper_route, origin, destination, osm_opts)
-        else:
-            future_osm = executor.submit(get_osm_route, origin, destination, osm_opts)
-
-        logging.debug("Waiting for routing tasks to complete...")
-        google_route, google_details = future_google.result()
-        here_route, here_details = future_here.result()
-        osm_route, osm_details = future_osm.result()
-        logging.debug(f"Google result: {'OK' if google_route else 'None'}. HERE result: {'OK' if here_route else 'None'}. OSM result: {'OK' if osm_route else 'None'}.")
+    logging.debug("Fetching routes from all providers...")
+    ((google_route, google_details),
+     (here_route, here_details),
+     (osm_route, osm_details)) = asyncio.run(fetch())
+    logging.debug(f"Google result: {'OK' if google_route else 'None'}. HERE result: {'OK' if here_route else 'None'}. OSM result: {'OK' if osm_route else 'None'}.")
 
     # --- Process results ---
     logging.debug("Processing API results...")
@@ -128,9 +317,8 @@ def calculate_single_route_comparison(origin, destination, strategy, osm_provide
 
     # --- Calculate stats ---
     if google_route:
-        google_gdf_proj = gpd.GeoDataFrame([{'geometry': google_route}], crs="EPSG:4326").to_crs(CRS_PROJ)
-        here_coverage = calculate_coverage(google_gdf_proj, here_route, BUFFER_METERS)
-        osm_coverage = calculate_coverage(google_gdf_proj, osm_route, BUFFER_METERS)
+        google_proj = project_to_utm(google_route)
+        here_coverage, osm_coverage = calculate_coverages(google_proj, [here_route, osm_route], BUFFER_METERS)
         stats[0] = {
             "here_coverage": f"{here_coverage:.2f}%",
             "osm_coverage": f"{osm_coverage:.2f}%",
@@ -163,17 +351,12 @@ def process_routes(bbox, strategy='shortest', osm_provider='osrm', origins_overr
         # Step 1: Generate points
         log_progress(1, total_steps, f"Generating {NUM_ROUTES} random origin/destination pairs...")
 
-        # Ensure the origin and destination are not the same
-        origins = []
-        destinations = []
-        while len(origins) < NUM_ROUTES:
-            # Generate a random origin and destination
-            raw_origin, raw_dest = generate_random_points_in_bbox(bbox, 2)
-            # Snap them to the nearest road to ensure they are routable
-            origin = snap_to_road_osrm(raw_origin)
-            dest = snap_to_road_osrm(raw_dest)
-            origins.append(origin)
-            destinations.append(dest)
+        raw_origins, raw_dests = generate_od_pairs(bbox, NUM_ROUTES)
+        # Snap the points to the nearest road to ensure they are routable;
+        # one batched request covers all 2*NUM_ROUTES of them.
+        snapped = snap_points_osrm(np.concatenate([raw_origins, raw_dests]))
+        origins = snapped[:NUM_ROUTES]
+        destinations = snapped[NUM_ROUTES:]
 
     google_routes = []
     here_routes = []
@@ -181,86 +364,153 @@ def process_routes(bbox, strategy='shortest', osm_provider='osrm', origins_overr
     od_points = []
     stats = {}
 
-    # --- Define routing options based on strategy ---
-    here_opts = {}
-    # Pass the strategy to the providers that support it
-    google_opts = {'strategy': strategy}
-    osm_opts = {'strategy': strategy}
-
-    if strategy == 'shortest':
-        here_opts = {'routingMode': 'short'}
-
-    # Use ThreadPoolExecutor to fetch routes concurrently
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        for i in range(NUM_ROUTES):
-            origin = origins[i]
-            destination = destinations[i]
-            # Step 1 (generation) + i+1 (current route)
-            log_progress(i + 2, total_steps, f"Fetching route {i+1}/{NUM_ROUTES}...")
-
-            od_points.append({'geometry': Point(origin), 'pair_id': i, 'type': 'origin'})
-            od_points.append({'geometry': Point(destination), 'pair_id': i, 'type': 'destination'})
-
-            # Submit all routing requests concurrently
-            future_google = executor.submit(get_google_route, origin, destination, google_opts)
-            future_here = executor.submit(get_here_route, origin, destination, here_opts)
-            
-            # Choose OSM provider based on the parameter
-            if osm_provider == 'graphhopper':
-                future_osm = executor.submit(get_graphhopper_route, origin, destination, osm_opts)
-            else: # Default to OSRM
-                future_osm = executor.submit(get_osm_route, origin, destination, osm_opts)
-
-            # Get results
-            google_route, google_details = future_google.result()
-            here_route, here_details = future_here.result()
-            osm_route, osm_details = future_osm.result()
-
-            if google_route:
-                google_routes.append({
-                    'geometry': google_route, 'route_id': i, 
-                    'distance': google_details.get('distance'), 'duration': google_details.get('duration'),
-                    'instructions': json.dumps(google_details.get('instructions', []))
-                })
-            if here_route:
-                here_routes.append({
-                    'geometry': here_route, 'route_id': i,
-                    'distance': here_details.get('distance'), 'duration': here_details.get('duration'),
-                    'instructions': json.dumps(here_details.get('instructions', []))
-                })
-            if osm_route:
-                osm_routes.append({
-                    'geometry': osm_route, 'route_id': i,
-                    'distance': osm_details.get('distance'), 'duration': osm_details.get('duration'),
-                    'instructions': json.dumps(osm_details.get('instructions', []))
-                })
-
-            # Calculate overlap stats if Google route exists
-            if google_route:
-                google_gdf_proj = gpd.GeoDataFrame([{'geometry': google_route}], crs="EPSG:4326").to_crs(CRS_PROJ)
-                here_coverage = calculate_coverage(google_gdf_proj, here_route, BUFFER_METERS)
-                osm_coverage = calculate_coverage(google_gdf_proj, osm_route, BUFFER_METERS)
-                
-                stats[i] = {
-                    "here_coverage": f"{here_coverage:.2f}%",
-                    "osm_coverage": f"{osm_coverage:.2f}%",
-                    "google_details": google_details,
-                    "here_details": here_details if here_details else {},
-                    "osm_details": osm_details if osm_details else {}
-                }
+    for i in range(NUM_ROUTES):
+        od_points.append({'geometry': Point(origins[i]), 'pair_id': i, 'type': 'origin'})
+        od_points.append({'geometry': Point(destinations[i]), 'pair_id': i, 'type': 'destination'})
+
+    # Phase 1: fetch every provider route for every OD pair in one batch.
+    # The workload is pure network I/O, so 3*NUM_ROUTES concurrent requests
+    # finish in roughly the latency of the slowest one instead of the sum
+    # of NUM_ROUTES sequential rounds.
+    async def fetch_all():
+        done = 0
+
+        async def fetch_one(i):
+            nonlocal done
+            result = await fetch_route_set(session, origins[i], destinations[i], strategy, osm_provider)
+            done += 1
+            log_progress(done + 1, total_steps, f"Fetched route {done}/{NUM_ROUTES}...")
+            return result
+
+        async with http_session.make_async_session() as session:
+            return await asyncio.gather(*(fetch_one(i) for i in range(NUM_ROUTES)))
+
+    results = asyncio.run(fetch_all())
+
+    # Phase 2: GEOS work (projection, buffering, coverage) on the gathered
+    # results, no longer interleaved with network waits. All comparisons of
+    # the run are scored in one vectorized pass.
+    base_ids, base_routes, candidate_lists = [], [], []
+    for i, ((google_route, _), (here_route, _), (osm_route, _)) in enumerate(results):
+        if google_route:
+            base_ids.append(i)
+            base_routes.append(google_route)
+            candidate_lists.append([here_route, osm_route])
+    coverage_by_id = dict(zip(base_ids, calculate_coverages_batch(base_routes, candidate_lists, BUFFER_METERS)))
+
+    for i, ((google_route, google_details),
+            (here_route, here_details),
+            (osm_route, osm_details)) in enumerate(results):
+        for route, details, bucket in ((google_route, google_details, google_routes),
+                                       (here_route, here_details, here_routes),
+                                       (osm_route, osm_details, osm_routes)):
+            if route:
+                bucket.append(route_record(route, details, i))
+
+        # Overlap stats exist only where the Google baseline does
+        if google_route:
+            here_coverage, osm_coverage = coverage_by_id[i]
+
+            stats[i] = {
+                "here_coverage": f"{here_coverage:.2f}%",
+                "osm_coverage": f"{osm_coverage:.2f}%",
+                "google_details": google_details,
+                "here_details": here_details if here_details else {},
+                "osm_details": osm_details if osm_details else {}
+            }
 
     log_progress(total_steps, total_steps, "Saving results...")
 
     return google_routes, here_routes, osm_routes, od_points, stats
 
-if __name__ == '__main__':
-    import os
+def save_all_results(google_routes, here_routes, osm_routes, od_points, stats):
+    """Persist route GeoJSON files, OD points and stats for the frontend."""
+    if not os.path.exists('data'):
+        os.makedirs('data')
+    save_gdf_to_geojson(google_routes, "google_routes.geojson")
+    save_gdf_to_geojson(here_routes, "here_routes.geojson")
+    save_gdf_to_geojson(osm_routes, "osm_routes.geojson")
+    save_gdf_to_geojson(od_points, "od_points.geojson")
+    with open("data/stats.json", "wb") as f:
+        f.write(orjson.dumps(stats, default=_json_default, option=_ORJSON_OPTS))
+
+def run_random_comparison(bbox, strategy='shortest', osm_provider='osrm'):
+    """Run a full comparison with random OD pairs and save the results."""
+    google_routes, here_routes, osm_routes, od_points, stats = process_routes(bbox, strategy, osm_provider)
+    save_all_results(google_routes, here_routes, osm_routes, od_points, stats)
+    log_progress(100, 100, "Comparison complete! You can now view the results.")
+
+def run_manual_comparison(origin, destination, strategy='shortest', osm_provider='osrm'):
+    """Run a single-route comparison and emit the result to the frontend."""
+    results = calculate_single_route_comparison(origin, destination, strategy, osm_provider)
+
+    log_progress(100, 100, "Manual calculation complete!")
+    logging.debug(f"Sending manual_result to frontend. OSM routes count: {len(results['osm_routes'])}")
+    emit_line(dumps_json({"type": "manual_result", "data": results}))
+
+def run_places_comparison(bbox, strategy='shortest', osm_provider='osrm'):
+    """Run a full comparison using Google Places POIs as OD pairs.
+
+    Raises ValueError if not enough usable POIs are found in the bbox.
+    """
     import random
     from google_places_client import search_pois_in_bbox
+
+    log_progress(10, 100, "Fetching POIs from Google Places...")
+    pois = search_pois_in_bbox(bbox, limit=50)
+
+    if len(pois) < 2:
+        raise ValueError("Not enough Google Places POIs found to generate routes.")
+
+    log_progress(30, 100, f"Generating {NUM_ROUTES} valid OD pairs from {len(pois)} POIs...")
+    origins_pois, dests_pois = [], []
+    attempts = 0
+    while len(origins_pois) < NUM_ROUTES and attempts < 100:
+        o_poi, d_poi = random.sample(pois, 2)
+        o_coords = (o_poi['geometry']['location']['lng'], o_poi['geometry']['location']['lat'])
+        d_coords = (d_poi['geometry']['location']['lng'], d_poi['geometry']['location']['lat'])
+
+        if haversine_distance(o_coords, d_coords) >= MIN_ROUTE_DISTANCE_KM:
+            origins_pois.append(o_poi)
+            dests_pois.append(d_poi)
+        attempts += 1
+
+    if not origins_pois:
+        raise ValueError("Could not generate any valid POI pairs meeting the distance requirement.")
+
+    # Use the coordinates of the selected POIs for routing
+    origins = [(p['geometry']['location']['lng'], p['geometry']['location']['lat']) for p in origins_pois]
+    dests = [(p['geometry']['location']['lng'], p['geometry']['location']['lat']) for p in dests_pois]
+
+    # Re-use the random mode's processing logic, but with POI-based points
+    google_routes, here_routes, osm_routes, od_points, stats = process_routes(bbox, strategy, osm_provider, origins_override=origins, dests_override=dests)
+    save_all_results(google_routes, here_routes, osm_routes, od_points, stats)
+
+    # Also save the POI data for the frontend to display
+    poi_data_for_frontend = []
+    # We need to handle both origin and destination POIs
+    all_pois = origins_pois + dests_pois
+    # Use a dictionary to keep track of unique POIs by their ID
+    unique_pois = {p['place_id']: p for p in all_pois}
+    for i, poi in enumerate(unique_pois.values()):
+        poi_data_for_frontend.append({
+            'id': i + 1,
+            'name': poi.get('name', 'N/A'),
+            'types': poi.get('types', []),
+            'coords': (poi['geometry']['location']['lng'], poi['geometry']['location']['lat'])
+        })
+    with open("data/pois.json", "w") as f:
+        json.dump(poi_data_for_frontend, f)
+
+    log_progress(100, 100, "Comparison complete! You can now view the results.")
+
+if __name__ == '__main__':
     logging.debug(f"data_processing.py script started with args: {sys.argv}")
 
-    if not os.path.exists('data'):
-        os.makedirs('data')
+    # Benchmarking switch: bypass the provider response cache
+    if '--no-cache' in sys.argv:
+        routing_cache.set_enabled(False)
+        sys.argv.remove('--no-cache')
 
     # Mode 1: Random (7 args: script, lon1, lat1, lon2, lat2, strategy, osm_provider)
     if len(sys.argv) == 7:
@@ -270,34 +520,14 @@ if __name__ == '__main__':
         except ValueError:
             logging.error("Invalid BBOX arguments. Using default.")
             current_bbox = BBOX
-        strategy = sys.argv[5]
-        osm_provider = sys.argv[6]
-        google_routes, here_routes, osm_routes, od_points, stats = process_routes(current_bbox, strategy, osm_provider)
-        
-        # Save all results for random mode
-        save_gdf_to_geojson(google_routes, "google_routes.geojson")
-        save_gdf_to_geojson(here_routes, "here_routes.geojson")
-        save_gdf_to_geojson(osm_routes, "osm_routes.geojson")
-        if od_points:
-            od_gdf = gpd.GeoDataFrame(od_points, crs="EPSG:4326", geometry='geometry')
-            od_gdf.to_file("data/od_points.geojson", driver='GeoJSON')
-        with open("data/stats.json", "w") as f:
-            json.dump(stats, f, cls=GeoJSONEncoder)
-
-        log_progress(100, 100, "Comparison complete! You can now view the results.")
+        run_random_comparison(current_bbox, sys.argv[5], sys.argv[6])
 
     # Mode 2: Manual (8 args: script, --manual, olon, olat, dlon, dlat, strategy, osm_provider)
     elif len(sys.argv) == 8 and sys.argv[1] == '--manual':
         logging.info("Running in MANUAL mode.")
         origin = (float(sys.argv[2]), float(sys.argv[3]))
         destination = (float(sys.argv[4]), float(sys.argv[5]))
-        strategy = sys.argv[6]
-        osm_provider = sys.argv[7]
-        results = calculate_single_route_comparison(origin, destination, strategy, osm_provider)
-        
-        log_progress(100, 100, "Manual calculation complete!")
-        logging.debug(f"Sending manual_result to frontend. OSM routes count: {len(results['osm_routes'])}")
-        print(json.dumps({"type": "manual_result", "data": results}, cls=GeoJSONEncoder, separators=(',', ':')), flush=True)
+        run_manual_comparison(origin, destination, sys.argv[6], sys.argv[7])
 
     # Mode 3: Google Places POIs (8 args: script, --places, lon1, lat1, lon2, lat2, strategy, osm_provider)
     elif len(sys.argv) == 8 and sys.argv[1] == '--places':
@@ -307,68 +537,12 @@ if __name__ == '__main__':
         except ValueError:
             logging.error("Invalid BBOX arguments. Using default.")
             current_bbox = BBOX
-        strategy = sys.argv[6]
-        osm_provider = sys.argv[7]
-
-        log_progress(10, 100, "Fetching POIs from Google Places...")
-        pois = search_pois_in_bbox(current_bbox, limit=50)
-
-        if len(pois) < 2:
-            logging.error("Not enough Google Places POIs found to generate routes.")
-            sys.exit(1)
-
-        log_progress(30, 100, f"Generating {NUM_ROUTES} valid OD pairs from {len(pois)} POIs...")
-        origins_pois, dests_pois = [], []
-        attempts = 0
-        while len(origins_pois) < NUM_ROUTES and attempts < 100:
-            o_poi, d_poi = random.sample(pois, 2)
-            o_coords = (o_poi['geometry']['location']['lng'], o_poi['geometry']['location']['lat'])
-            d_coords = (d_poi['geometry']['location']['lng'], d_poi['geometry']['location']['lat'])
-
-            if haversine_distance(o_coords, d_coords) >= MIN_ROUTE_DISTANCE_KM:
-                origins_pois.append(o_poi)
-                dests_pois.append(d_poi)
-            attempts += 1
-        
-        if not origins_pois:
-            logging.error("Could not generate any valid POI pairs meeting the distance requirement.")
+        try:
+            run_places_comparison(current_bbox, sys.argv[6], sys.argv[7])
+        except ValueError as e:
+            logging.error(str(e))
             sys.exit(1)
 
-        # Use the coordinates of the selected POIs for routing
-        origins = [(p['geometry']['location']['lng'], p['geometry']['location']['lat']) for p in origins_pois]
-        dests = [(p['geometry']['location']['lng'], p['geometry']['location']['lat']) for p in dests_pois]
-
-        # Re-use the random mode's processing logic, but with POI-based points
-        google_routes, here_routes, osm_routes, od_points, stats = process_routes(current_bbox, strategy, osm_provider, origins_override=origins, dests_override=dests)
-        # Save all results
-        save_gdf_to_geojson(google_routes, "google_routes.geojson")
-        save_gdf_to_geojson(here_routes, "here_routes.geojson")
-        save_gdf_to_geojson(osm_routes, "osm_routes.geojson")
-        if od_points:
-            od_gdf = gpd.GeoDataFrame(od_points, crs="EPSG:4326", geometry='geometry')
-            od_gdf.to_file("data/od_points.geojson", driver='GeoJSON')
-        
-        # Also save the POI data for the frontend to display
-        poi_data_for_frontend = []
-        # We need to handle both origin and destination POIs
-        all_pois = origins_pois + dests_pois
-        # Use a dictionary to keep track of unique POIs by their ID
-        unique_pois = {p['place_id']: p for p in all_pois}
-        for i, poi in enumerate(unique_pois.values()):
-            poi_data_for_frontend.append({
-                'id': i + 1,
-                'name': poi.get('name', 'N/A'),
-                'types': poi.get('types', []),
-                'coords': (poi['geometry']['location']['lng'], poi['geometry']['location']['lat'])
-            })
-        with open("data/pois.json", "w") as f:
-            json.dump(poi_data_for_frontend, f)
-
-        with open("data/stats.json", "w") as f:
-            json.dump(stats, f, cls=GeoJSONEncoder)
-
-        log_progress(100, 100, "Comparison complete! You can now view the results.")
-
     else:
         logging.error(f"Invalid arguments. Received {len(sys.argv)} arguments: {sys.argv}")
         sys.exit(1)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import os
 import requests
+
+import http_session
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,7 +31,7 @@ def search_pois_in_bbox(bbox, limit=50):
     }
 
     try:
-        response = requests.get(FSQ_PLACES_ENDPOINT, params=params, headers=headers, timeout=15)
+        response = http_session.get_session().get(FSQ_PLACES_ENDPOINT, params=params, headers=headers, timeout=15)
         response.raise_for_status()
         data = response.json()
         logger.info(f"Foursquare API returned {len(data.get('results', []))} POIs.")
@@ -1,4 +1,6 @@
 import os
+import json
+import functools
 import logging
 import google.generativeai as genai
 import openai
@@ -36,6 +38,26 @@ def format_route_details_for_prompt(route_details):
         f"First 5 Instructions:\n{instructions}"
     )
 
+@functools.lru_cache(maxsize=64)
+def _format_details_cached(details_json):
+    """Cached formatting, keyed on the canonical JSON of the details dict."""
+    return format_route_details_for_prompt(json.loads(details_json))
+
+def _route_data_block(route_stats):
+    """Build the per-provider data section shared by both prompt templates.
+
+    Users typically re-evaluate the same comparison with different prompts,
+    so the formatted details are cached per route rather than rebuilt on
+    every evaluation.
+    """
+    sections = []
+    for label, key in (("Google", 'google_details'),
+                       ("HERE", 'here_details'),
+                       ("OSM", 'osm_details')):
+        details_json = json.dumps(route_stats.get(key), sort_keys=True)
+        sections.append(f"--- {label} Route ---\n{_format_details_cached(details_json)}")
+    return "\n".join(sections)
+
 def stream_gemini_evaluation(route_stats, user_prompt):
     """
     Streams an evaluation from the Gemini API based on route statistics and a user prompt.
@@ -47,18 +69,9 @@ def stream_gemini_evaluation(route_stats, user_prompt):
     # Use the latest stable model name
     model = genai.GenerativeModel('gemini-1.0-pro')
 
-    google_details = format_route_details_for_prompt(route_stats.get('google_details'))
-    here_details = format_route_details_for_prompt(route_stats.get('here_details'))
-    osm_details = format_route_details_for_prompt(route_stats.get('osm_details'))
-
     system_prompt = f"""You are an expert transportation and logistics analyst. Your task is to compare three route options based on the data provided and the user's request. Be concise and insightful.
 Here is the data for the three routes:
---- Google Route ---
-{google_details}
---- HERE Route ---
-{here_details}
---- OSM Route ---
-{osm_details}
+{_route_data_block(route_stats)}
 ---
 User's request: "{user_prompt}"
 
@@ -99,18 +112,9 @@ def stream_openai_compatible_evaluation(provider, route_stats, user_prompt):
 
     client = openai.OpenAI(api_key=api_key, base_url=base_url)
 
-    google_details = format_route_details_for_prompt(route_stats.get('google_details'))
-    here_details = format_route_details_for_prompt(route_stats.get('here_details'))
-    osm_details = format_route_details_for_prompt(route_stats.get('osm_details'))
-
     system_prompt = f"""You are an expert transportation and logistics analyst. Your task is to compare three route options based on the data provided and the user's request. Be concise and insightful.
 Here is the data for the three routes:
---- Google Route ---
-{google_details}
---- HERE Route ---
-{here_details}
---- OSM Route ---
-{osm_details}
+{_route_data_block(route_stats)}
 ---"""
 
     try:
@@ -0,0 +1,25 @@
+import numpy as np
+
+# Lightweight geographic helpers. Kept free of heavy imports (geopandas,
+# pyproj, shapely) so clients like google_places_client can use haversine
+# at module load without paying for the full data-processing stack.
+
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_np(lon1, lat1, lon2, lat2):
+    """Great-circle distance in kilometers; accepts scalars or NumPy arrays.
+
+    Fully vectorized: passing coordinate arrays computes all distances in
+    one ufunc pass with no Python-level loop.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(a))
+
+
+def haversine_distance(p1, p2):
+    """Calculate the distance between two (lon, lat) points in kilometers."""
+    return float(haversine_np(p1[0], p1[1], p2[0], p2[1]))
@@ -1,5 +1,8 @@
 import os
 import requests
+
+import http_session
+from geo_utils import haversine_distance
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +26,6 @@ def search_pois_in_bbox(bbox, limit=20):
     center_lat = (bbox[1] + bbox[3]) / 2
     
     # Calculate radius (diagonal distance / 2) in meters
-    from data_processing import haversine_distance
     radius_km = haversine_distance((bbox[0], bbox[1]), (bbox[2], bbox[3])) / 2
     radius_meters = radius_km * 1000
 
@@ -34,7 +36,7 @@ def search_pois_in_bbox(bbox, limit=20):
     }
 
     try:
-        response = requests.get(PLACES_API_ENDPOINT, params=params, timeout=15)
+        response = http_session.get_session().get(PLACES_API_ENDPOINT, params=params, timeout=15)
         response.raise_for_status()
         data = response.json()
         logger.info(f"Google Places API returned {len(data.get('results', []))} POIs.")
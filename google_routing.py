@@ -1,6 +1,10 @@
 import os
+import re
+import aiohttp
 import googlemaps
-from shapely.geometry import LineString
+import numpy as np
+import shapely
+import http_session
 from dotenv import load_dotenv
 import logging
 
@@ -10,7 +14,71 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_ROADS_API_KEY") # Using the same key as before
-gmaps = googlemaps.Client(key=GOOGLE_API_KEY)
+# Ride on the shared pooled session so concurrent directions calls reuse
+# keep-alive connections instead of exhausting the SDK's default pool of 10
+gmaps = googlemaps.Client(key=GOOGLE_API_KEY,
+                          requests_session=http_session.get_session(),
+                          requests_kwargs={'timeout': 15},
+                          retry_timeout=30)
+
+# REST endpoint used by the async path; the googlemaps SDK is sync-only.
+DIRECTIONS_ENDPOINT = "https://maps.googleapis.com/maps/api/directions/json"
+
+# Compiled once: html_instructions stripping runs per step of every route
+_HTML_TAG_RE = re.compile(r'<[^<]+?>')
+
+def _select_and_parse_route(directions_result, strategy):
+    """Pick the best alternative for the strategy and extract (line, details).
+
+    Works on the route list shape shared by the googlemaps SDK and the
+    Directions REST API.
+    """
+    logger.debug(f"Google API returned {len(directions_result)} alternative routes.")
+
+    if not directions_result:
+        logger.warning("Google API returned no route.")
+        return None, None
+
+    if strategy == 'shortest':
+        # Find the route with the minimum distance
+        best_route = min(directions_result, key=lambda r: r['legs'][0]['distance']['value'])
+    else: # 'fastest' or default
+        # Find the route with the minimum duration
+        best_route = min(directions_result, key=lambda r: r['legs'][0]['duration']['value'])
+
+    route = best_route
+    polyline = route['overview_polyline']['points']
+    decoded_polyline = googlemaps.convert.decode_polyline(polyline)
+    # The decoded polyline is a list of dicts {'lat': ..., 'lng': ...}.
+    # Fill an (N, 2) lon/lat array in one pass and let shapely's vectorized
+    # constructor build the LineString straight from the buffer, skipping
+    # the per-vertex Python tuple list.
+    coords = np.fromiter((c for point in decoded_polyline for c in (point['lng'], point['lat'])),
+                         dtype=np.float64, count=2 * len(decoded_polyline)).reshape(-1, 2)
+    line = shapely.linestrings(coords)
+
+    # Extract summary info (distance in meters, duration in seconds)
+    leg = route['legs'][0]
+
+    # Extract street names from steps, de-duplicated while preserving order
+    instructions = []
+    seen = set()
+    for step in leg.get('steps', []):
+        # The html_instructions are the most reliable source for street names
+        instruction = step.get('html_instructions', '')
+        # Remove HTML tags and extract content
+        plain_text = _HTML_TAG_RE.sub(' ', instruction).strip()
+        if plain_text and plain_text not in seen:
+            seen.add(plain_text)
+            instructions.append(plain_text)
+
+    details = {
+        'distance': leg['distance']['value'],
+        'duration': leg['duration']['value'],
+        'instructions': instructions
+    }
+
+    return line, details
 
 def get_google_route(origin, destination, routing_options=None):
     """
@@ -19,7 +87,7 @@ def get_google_route(origin, destination, routing_options=None):
     logger.debug(f"get_google_route called with origin: {origin}, destination: {destination}")
     if routing_options is None:
         routing_options = {}
-        
+
     # Pop the strategy to use it for logic, not as a query param
     strategy = routing_options.pop('strategy', 'fastest')
 
@@ -33,52 +101,45 @@ def get_google_route(origin, destination, routing_options=None):
             **routing_options
         )
 
-        logger.debug(f"Google API returned {len(directions_result)} alternative routes.")
-
-        if directions_result:
-            best_route = None
-            
-            if strategy == 'shortest':
-                # Find the route with the minimum distance
-                best_route = min(directions_result, key=lambda r: r['legs'][0]['distance']['value'])
-            else: # 'fastest' or default
-                # Find the route with the minimum duration
-                best_route = min(directions_result, key=lambda r: r['legs'][0]['duration']['value'])
-
-            route = best_route
-            polyline = route['overview_polyline']['points']
-            decoded_polyline = googlemaps.convert.decode_polyline(polyline)
-            # The decoded polyline is a list of dicts {'lat': ..., 'lng': ...}
-            # Convert it to a list of (lon, lat) tuples for shapely
-            line = LineString([(point['lng'], point['lat']) for point in decoded_polyline])
-            
-            # Extract summary info (distance in meters, duration in seconds)
-            leg = route['legs'][0]
-            
-            # Extract street names from steps
-            instructions = []
-            import re
-            for step in leg.get('steps', []):
-                # The html_instructions are the most reliable source for street names
-                instruction = step.get('html_instructions', '')
-                # Remove HTML tags and extract content
-                plain_text = re.sub('<[^<]+?>', ' ', instruction).strip()
-                if plain_text:
-                    instructions.append(plain_text)
-
-            details = {
-                'distance': leg['distance']['value'], 
-                'duration': leg['duration']['value'],
-                'instructions': list(dict.fromkeys(instructions)) # Remove duplicates
-            }
-            
-            return line, details
-        else:
-            logger.warning("Google API returned no route.")
-            return None, None
+        return _select_and_parse_route(directions_result, strategy)
     except googlemaps.exceptions.ApiError as e:
         logger.error(f"Google API Error: {e}")
         return None, None
     except Exception as e:
         logger.error(f"An unexpected error occurred with Google API: {e}")
         return None, None
+
+async def get_google_route_async(session, origin, destination, routing_options=None):
+    """
+    Async variant of get_google_route using a shared aiohttp session and the
+    Directions REST API (the googlemaps SDK has no async client).
+    """
+    logger.debug(f"get_google_route_async called with origin: {origin}, destination: {destination}")
+    if routing_options is None:
+        routing_options = {}
+
+    # Pop the strategy to use it for logic, not as a query param
+    strategy = routing_options.pop('strategy', 'fastest')
+
+    params = {
+        'origin': f'{origin[1]},{origin[0]}',
+        'destination': f'{destination[1]},{destination[0]}',
+        'mode': 'driving',
+        'alternatives': 'true',
+        'key': GOOGLE_API_KEY,
+        **routing_options
+    }
+
+    try:
+        async with session.get(DIRECTIONS_ENDPOINT, params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        if data.get('status') not in ('OK', 'ZERO_RESULTS'):
+            logger.error(f"Google API Error: {data.get('status')}")
+            return None, None
+
+        return _select_and_parse_route(data.get('routes', []), strategy)
+    except (aiohttp.ClientError, TimeoutError) as e:
+        logger.error(f"Error fetching Google route: {e}")
+        return None, None
@@ -1,35 +1,54 @@
 import os
+import time
+import threading
 import requests
-import json
-from datetime import date
+import orjson
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from osm_routing import _update_gh_usage, get_graphhopper_usage
+
+load_dotenv()
+
+# Route responses keyed by (start, end, mode), kept for an hour. The road
+# network doesn't change within a session, so repeated queries for the same
+# triple skip the API call entirely - and the usage counter with it. Values
+# are stored as orjson bytes so a hit hands each caller its own fresh dict.
+# Bounded LRU: route blobs run to tens of KB, so the cap is smaller than the
+# geometry caches elsewhere in the series.
+_ROUTE_CACHE_TTL = 3600
+_ROUTE_CACHE_MAX = 1024
+_route_cache = OrderedDict()
+_route_cache_lock = threading.Lock()
+
+# Read once at import; the key does not change while the process runs
+_API_KEY = os.environ.get('GRAPHHOPPER_API_KEY')
 
 def get_api_key():
-    return os.environ.get('GRAPHHOPPER_API_KEY')
+    return _API_KEY
 
 def get_usage_count():
-    try:
-        with open('data/graphhopper_usage.json', 'r') as f:
-            usage_data = json.load(f)
-            today = str(date.today())
-            if usage_data.get('date') == today:
-                return usage_data.get('count', 0)
-            else:
-                return 0
-    except (FileNotFoundError, json.JSONDecodeError):
-        return 0
-
-def increment_usage_count():
-    count = get_usage_count()
-    today = str(date.today())
-    usage_data = {'date': today, 'count': count + 1}
-    with open('data/graphhopper_usage.json', 'w') as f:
-        json.dump(usage_data, f)
+    """Today's GraphHopper call count, from the shared in-memory counter."""
+    return get_graphhopper_usage()
 
 def calculate_route(start_point, end_point, mode):
     api_key = get_api_key()
     if not api_key:
         raise ValueError("GraphHopper API key not found.")
 
+    cache_key = (tuple(start_point), tuple(end_point), mode)
+    with _route_cache_lock:
+        cached = _route_cache.get(cache_key)
+        if cached is not None:
+            stored_at, blob = cached
+            if time.monotonic() - stored_at < _ROUTE_CACHE_TTL:
+                _route_cache.move_to_end(cache_key)
+            else:
+                del _route_cache[cache_key]
+                cached = None
+    if cached is not None:
+        return orjson.loads(cached[1])
+
     profile = 'car'
     optimization = 'fastest' if mode == 'fastest' else 'shortest'
 
@@ -47,8 +66,8 @@ def calculate_route(start_point, end_point, mode):
     try:
         response = requests.get(url, params=params)
         response.raise_for_status()
-        increment_usage_count()
-        data = response.json()
+        _update_gh_usage()
+        data = orjson.loads(response.content)
         
         if 'paths' not in data or not data['paths']:
             return None
@@ -67,6 +86,11 @@ def calculate_route(start_point, end_point, mode):
                 'coordinates': coordinates
             }
         }
+        with _route_cache_lock:
+            _route_cache[cache_key] = (time.monotonic(), orjson.dumps(route_geojson))
+            _route_cache.move_to_end(cache_key)
+            if len(_route_cache) > _ROUTE_CACHE_MAX:
+                _route_cache.popitem(last=False)
         return route_geojson
 
     except requests.exceptions.RequestException as e:
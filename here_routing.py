@@ -1,7 +1,12 @@
 import os
+from collections import OrderedDict
+
+import aiohttp
 import requests
-import flexpolyline
-from shapely.geometry import LineString
+import http_session
+import orjson
+import numpy as np
+import shapely
 from dotenv import load_dotenv
 import logging
 
@@ -13,68 +18,150 @@ HERE_API_KEY = os.getenv("HERE_MAP_DATA_API_KEY")
 HERE_ROUTING_ENDPOINT = "https://router.hereapi.com/v8/routes"
 HERE_REVGEOCODE_ENDPOINT = "https://revgeocode.search.hereapi.com/v1/revgeocode"
 
-def get_here_route(origin, destination, routing_options=None):
-    """
-    Get a route from HERE Routing API v8.
+# char -> value table for HERE's flexible-polyline alphabet
+_FLEX_CHARS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+_FLEX_TABLE = [0] * 128
+for _i, _c in enumerate(_FLEX_CHARS):
+    _FLEX_TABLE[ord(_c)] = _i
+
+def _decode_flexpolyline(encoded):
+    """Decode a HERE flexible polyline into an (N, 2) lon/lat float64 array.
+
+    The upstream flexpolyline decoder walks the string with per-coordinate
+    Python arithmetic; this version splits the varints in one LUT-driven
+    pass and leaves zigzag decoding, delta accumulation and scaling to
+    vectorized NumPy. A third dimension, if present, is parsed and dropped.
     """
-    if not HERE_API_KEY:
-        logger.error("HERE_API_KEY not set. Cannot fetch HERE route.")
-        return None, None
-    if routing_options is None:
-        routing_options = {}
+    table = _FLEX_TABLE
+    raw = []
+    value = 0
+    shift = 0
+    for char in encoded:
+        chunk = table[ord(char)]
+        value += (chunk & 0x1F) << shift
+        if chunk & 0x20:
+            shift += 5
+        else:
+            raw.append(value)
+            value = 0
+            shift = 0
 
-    params = {
+    # raw[0] is the format version; raw[1] packs precision and the third
+    # dimension type, both plain unsigned varints
+    header = raw[1]
+    precision = header & 15
+    dims = 3 if (header >> 4) & 7 else 2
+    deltas = np.asarray(raw[2:], dtype=np.int64)
+    deltas = (deltas >> 1) ^ -(deltas & 1)  # zigzag -> signed
+    coords = np.cumsum(deltas.reshape(-1, dims), axis=0) / (10.0 ** precision)
+    # Stored order is (lat, lng[, z]); return (lon, lat)
+    return coords[:, 1::-1]
+
+def _build_here_params(origin, destination, routing_options, want_instructions=True):
+    """Build the HERE routing query parameters.
+
+    Turn-by-turn actions dominate the response size; callers that only need
+    the geometry can drop them with want_instructions=False for a several-
+    fold smaller payload.
+    """
+    return {
         'transportMode': 'car',
         'origin': f'{origin[1]},{origin[0]}',
         'destination': f'{destination[1]},{destination[0]}',
-        'return': 'polyline,summary,actions,instructions',
+        'return': 'polyline,summary,actions,instructions' if want_instructions else 'polyline,summary',
         'apiKey': HERE_API_KEY,
         **routing_options
     }
 
+def _parse_here_response(data):
+    """Extract (line, details) from a HERE routing response."""
+    if 'routes' in data and data['routes']:
+        route = data['routes'][0]
+
+        # Combine polylines and summaries from all sections
+        section_coords = []
+        total_length = 0
+        total_duration = 0
+        instructions = []
+        seen = set()
+        for section in route['sections']:
+            section_coords.append(_decode_flexpolyline(section['polyline']))
+            total_length += section['summary']['length']
+            total_duration += section['summary']['duration']
+            # Extract street names from actions, de-duplicated in order
+            for action in section.get('actions', ()):
+                instruction = action.get('instruction')
+                if instruction and instruction not in seen:
+                    seen.add(instruction)
+                    instructions.append(instruction)
+
+        # Sections decode straight to (lon, lat) arrays; one concatenate
+        # feeds shapely's vectorized constructor
+        line = shapely.linestrings(np.concatenate(section_coords))
+        details = {'distance': total_length, 'duration': total_duration, 'instructions': instructions}
+        return line, details
+    return None, None
+
+def get_here_route(origin, destination, routing_options=None, want_instructions=True):
+    """
+    Get a route from HERE Routing API v8.
+    """
+    if not HERE_API_KEY:
+        logger.error("HERE_API_KEY not set. Cannot fetch HERE route.")
+        return None, None
+    params = _build_here_params(origin, destination, routing_options or {}, want_instructions)
+
     try:
-        response = requests.get(HERE_ROUTING_ENDPOINT, params=params)
+        response = http_session.get_session().get(HERE_ROUTING_ENDPOINT, params=params)
         response.raise_for_status()
-        data = response.json()
-
-        if 'routes' in data and data['routes']:
-            route = data['routes'][0]
-            
-            # Combine polylines and summaries from all sections
-            full_polyline = []
-            total_length = 0
-            total_duration = 0
-            instructions = []
-            for section in route['sections']:
-                decoded_section = flexpolyline.decode(section['polyline'])
-                full_polyline.extend(decoded_section)
-                total_length += section['summary']['length']
-                total_duration += section['summary']['duration']
-                # Extract street names from actions
-                for action in section.get('actions', []):
-                    instruction = action.get('instruction', '')
-                    if instruction:
-                        instructions.append(instruction)
-
-            # The decoded polyline is a list of (lat, lon) tuples
-            # Convert it to (lon, lat) for shapely
-            line = LineString([(lon, lat) for lat, lon in full_polyline])
-            details = {'distance': total_length, 'duration': total_duration, 'instructions': list(dict.fromkeys(instructions))} # Remove duplicates
-            return line, details
+        # orjson parses the raw bytes, skipping requests' str decode pass
+        return _parse_here_response(orjson.loads(response.content))
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching HERE route: {e}")
         return None, None # Explicitly return a tuple of Nones
 
+async def get_here_route_async(session, origin, destination, routing_options=None, want_instructions=True):
+    """
+    Async variant of get_here_route using a shared aiohttp session.
+    """
+    if not HERE_API_KEY:
+        logger.error("HERE_API_KEY not set. Cannot fetch HERE route.")
+        return None, None
+    params = _build_here_params(origin, destination, routing_options or {}, want_instructions)
+
+    try:
+        async with session.get(HERE_ROUTING_ENDPOINT, params=params) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+        return _parse_here_response(data)
+    except (aiohttp.ClientError, TimeoutError) as e:
+        logger.error(f"Error fetching HERE route: {e}")
+        return None, None
+
+# Memo of successful snaps keyed by rounded coordinates. Interactive use
+# re-snaps the same locations constantly; a hit skips the revgeocode
+# round-trip. Failures are not stored, so a transient error doesn't pin the
+# unsnapped fallback.
+_SNAP_CACHE_MAX = 8192
+_snap_cache = OrderedDict()
+
 def snap_to_road_here(point):
     """
     Snaps a single point (lon, lat) to the nearest road using the HERE Reverse Geocode API.
     Returns the snapped (lon, lat) tuple, or the original point if snapping fails.
+    Successful results are memoized on coordinates rounded to 5 decimals (~1 m).
     """
     if not HERE_API_KEY:
         logger.error("HERE_API_KEY not set, cannot snap to road.")
         return point
 
     lon, lat = point
+    key = (round(lon, 5), round(lat, 5))
+    cached = _snap_cache.get(key)
+    if cached is not None:
+        _snap_cache.move_to_end(key)
+        return cached
+
     params = {
         'at': f'{lat},{lon}',
         'lang': 'en-US',
@@ -82,13 +169,17 @@ def snap_to_road_here(point):
     }
 
     try:
-        response = requests.get(HERE_REVGEOCODE_ENDPOINT, params=params, timeout=5)
+        response = http_session.get_session().get(HERE_REVGEOCODE_ENDPOINT, params=params, timeout=5)
         response.raise_for_status()
         data = response.json()
         if data.get('items') and data['items'][0].get('position'):
             snapped_pos = data['items'][0]['position']
-            return (snapped_pos['lng'], snapped_pos['lat'])
+            snapped = (snapped_pos['lng'], snapped_pos['lat'])
+            _snap_cache[key] = snapped
+            if len(_snap_cache) > _SNAP_CACHE_MAX:
+                _snap_cache.popitem(last=False)
+            return snapped
     except requests.exceptions.RequestException as e:
         logger.warning(f"Could not snap point {point} with HERE API: {e}. Using original point.")
-    
+
     return point # Fallback to original point
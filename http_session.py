@@ -0,0 +1,57 @@
+import atexit
+import threading
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Pooled keep-alive sessions for the synchronous HTTP clients. The provider
+# calls are small GETs where the TCP+TLS handshake dominates, so reusing
+# pooled connections skips it on every request after the first.
+#
+# requests.Session is not guaranteed thread-safe, and the sync clients run
+# from both the task worker thread and the CLI, so each thread gets its own
+# session rather than all of them mutating one.
+
+_local = threading.local()
+_sessions = []
+_sessions_lock = threading.Lock()
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32,
+                          max_retries=Retry(total=3, backoff_factor=0.2))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """Return the calling thread's pooled requests.Session."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _build_session()
+        _local.session = session
+        with _sessions_lock:
+            _sessions.append(session)
+    return session
+
+
+@atexit.register
+def _close_sessions():
+    with _sessions_lock:
+        for session in _sessions:
+            session.close()
+
+
+def make_async_session():
+    """Build the aiohttp session shared by all async provider calls.
+
+    One session means one connector: the three provider hosts share a DNS
+    cache and their keep-alive connections live in one pool, so back-to-back
+    route batches reuse resolved addresses and warm connections.
+    """
+    connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector)
@@ -1,7 +1,22 @@
 import logging
 import os
 import sys
-import json
+import orjson
+
+# Custom formatter to handle JSON encoding of the message.
+# Module-level so other log consumers (e.g. the task worker) can reuse it.
+class JsonFormatter(logging.Formatter):
+    # Level names are a tiny fixed set, so the '{"level":...,"message":'
+    # prefix is built once per level; each record then only pays for
+    # escaping its own message.
+    _prefixes = {}
+
+    def format(self, record):
+        prefix = self._prefixes.get(record.levelname)
+        if prefix is None:
+            prefix = '{"level":%s,"message":' % orjson.dumps(record.levelname).decode()
+            self._prefixes[record.levelname] = prefix
+        return prefix + orjson.dumps(record.getMessage()).decode() + '}'
 
 def setup_logger():
     """
@@ -11,15 +26,6 @@ def setup_logger():
     log_level_str = os.getenv('LOG_LEVEL', 'INFO').upper()
     log_level = getattr(logging, log_level_str, logging.INFO)
 
-    # Custom formatter to handle JSON encoding of the message
-    class JsonFormatter(logging.Formatter):
-        def format(self, record):
-            log_record = {
-                "level": record.levelname,
-                "message": record.getMessage()
-            }
-            return json.dumps(log_record)
-
     formatter = JsonFormatter()
     handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
@@ -1,65 +1,104 @@
+import aiohttp
 import requests
-import polyline
-from shapely.geometry import LineString
+import http_session
+import orjson
+import atexit
+import numpy as np
+import shapely
 import os
 import json
+import time
+import threading
 from datetime import datetime, timezone
 import pytz
+from dotenv import load_dotenv
 import logging
 
+load_dotenv()
+
 logger = logging.getLogger(__name__)
 
 OSRM_ENDPOINT = "http://router.project-osrm.org/route/v1/driving/"
 GRAPHHOPPER_ENDPOINT = "https://graphhopper.com/api/1/route"
 OSRM_NEAREST_ENDPOINT = "http://router.project-osrm.org/nearest/v1/driving/"
+# Read once at import (load_dotenv above makes .env visible); the key does
+# not change while the process runs, so the hot path skips the environ dict
+GRAPHHOPPER_API_KEY = os.getenv("GRAPHHOPPER_API_KEY")
 USAGE_FILE = 'graphhopper_usage.json'
 
-def _update_gh_usage():
-    """Increments the GraphHopper API usage count for the current day."""
+# The GraphHopper usage count lives in memory behind a lock; a daemon thread
+# persists it atomically every few seconds. The old per-call
+# read-modify-write both raced under concurrency (two callers could read
+# count=N and write N+1) and put two disk round-trips on the request path.
+_USAGE_FLUSH_SECONDS = 30
+_usage_lock = threading.Lock()
+_usage_state = None  # {'date': ..., 'count': ...}, loaded lazily from disk
+_usage_flusher_started = False
+
+def _usage_for_today_locked():
+    """Return the mutable usage dict for today; caller holds _usage_lock."""
+    global _usage_state
     today = datetime.utcnow().strftime('%Y-%m-%d')
-    usage = {'date': today, 'count': 0}
-    if os.path.exists(USAGE_FILE):
+    if _usage_state is None:
+        _usage_state = {'date': today, 'count': 0}
         try:
             with open(USAGE_FILE, 'r') as f:
                 data = json.load(f)
             if data.get('date') == today:
-                usage = data
+                _usage_state = data
         except (json.JSONDecodeError, IOError):
-            # If file is corrupted or unreadable, start fresh
+            # If file is missing, corrupted or unreadable, start fresh
             pass
-    
-    usage['count'] += 1
-    
-    with open(USAGE_FILE, 'w') as f:
-        json.dump(usage, f)
+    elif _usage_state.get('date') != today:
+        _usage_state = {'date': today, 'count': 0}
+    return _usage_state
+
+def _flush_usage():
+    """Persist the in-memory usage count atomically (temp file + replace)."""
+    with _usage_lock:
+        if _usage_state is None:
+            return
+        snapshot = dict(_usage_state)
+    tmp_path = USAGE_FILE + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(snapshot))
+        os.replace(tmp_path, USAGE_FILE)
+    except IOError as e:
+        logger.warning(f"Could not persist GraphHopper usage: {e}")
+
+# Counts accumulated since the last periodic flush would otherwise be lost
+# when the process exits
+atexit.register(_flush_usage)
+
+def _usage_flush_loop():
+    while True:
+        time.sleep(_USAGE_FLUSH_SECONDS)
+        _flush_usage()
+
+def _ensure_usage_flusher_locked():
+    global _usage_flusher_started
+    if not _usage_flusher_started:
+        threading.Thread(target=_usage_flush_loop, name='gh-usage-flush',
+                         daemon=True).start()
+        _usage_flusher_started = True
+
+def _update_gh_usage():
+    """Increments the GraphHopper API usage count for the current day."""
+    with _usage_lock:
+        _usage_for_today_locked()['count'] += 1
+        _ensure_usage_flusher_locked()
 
 def get_graphhopper_usage():
     """Gets the GraphHopper API usage count for the current day."""
-    today = datetime.utcnow().strftime('%Y-%m-%d')
-    if not os.path.exists(USAGE_FILE):
-        return 0
-    try:
-        with open(USAGE_FILE, 'r') as f:
-            data = json.load(f)
-        if data.get('date') == today:
-            return data.get('count', 0)
-    except (json.JSONDecodeError, IOError):
-        pass
-    return 0
-
-def get_graphhopper_route(origin, destination, routing_options=None):
-    """
-    Get a route from GraphHopper API.
-    """
-    logger.debug(f"get_graphhopper_route called with origin: {origin}, destination: {destination}")
-    api_key = os.getenv("GRAPHHOPPER_API_KEY")
+    with _usage_lock:
+        return _usage_for_today_locked()['count']
 
-    if not api_key:
+def _build_graphhopper_params(origin, destination, routing_options, want_instructions=True):
+    """Build the GraphHopper query parameters, or None if the key is missing."""
+    if not GRAPHHOPPER_API_KEY:
         logger.error("GRAPHHOPPER_API_KEY not set.")
-        return None, None
-
-    if routing_options is None:
-        routing_options = {}
+        return None
 
     # Map our strategy to GraphHopper's 'weighting' parameter
     strategy = routing_options.pop('strategy', 'fastest') # Pop to avoid sending it as a query param
@@ -67,97 +106,168 @@ def get_graphhopper_route(origin, destination, routing_options=None):
 
     params = {
         'vehicle': 'car',
-        'instructions': 'true',
-        'points_encoded': 'true',
-        'key': api_key,
+        'instructions': 'true' if want_instructions else 'false',
+        # Unencoded points arrive as a GeoJSON coordinate array, skipping
+        # the pure-Python polyline decode entirely (gzip absorbs the size)
+        'points_encoded': 'false',
+        'key': GRAPHHOPPER_API_KEY,
         'weighting': weighting,
         **routing_options
     }
     # Manually add point parameters to ensure correct formatting
     params['point'] = [f'{origin[1]},{origin[0]}', f'{destination[1]},{destination[0]}']
+    return params
+
+def _parse_graphhopper_response(data):
+    """Extract (line, details) from a GraphHopper route response."""
+    if 'paths' in data and data['paths']:
+        path = data['paths'][0]
+        # With points_encoded=false the geometry is a GeoJSON LineString
+        # with (lon, lat) coordinates - no decode, no axis swap
+        coords = np.asarray(path['points']['coordinates'], dtype=np.float64)
+        line = shapely.linestrings(coords[:, :2])
+
+        instructions = [item['text'] for item in path.get('instructions', [])]
+
+        details = {
+            'distance': path['distance'], # meters
+            'duration': path['time'] / 1000, # ms to seconds
+            'instructions': instructions
+        }
+        return line, details
+    logger.warning(f"GraphHopper API returned no route. Response: {data}")
+    return None, None
+
+def get_graphhopper_route(origin, destination, routing_options=None, want_instructions=True):
+    """
+    Get a route from GraphHopper API.
+    """
+    logger.debug("get_graphhopper_route called with origin: %s, destination: %s", origin, destination)
+    params = _build_graphhopper_params(origin, destination, routing_options or {}, want_instructions)
+    if params is None:
+        return None, None
 
     try:
         # Use requests' ability to handle lists of parameters correctly
-        response = requests.get(GRAPHHOPPER_ENDPOINT, params=params, timeout=15)
+        response = http_session.get_session().get(GRAPHHOPPER_ENDPOINT, params=params, timeout=15)
         response.raise_for_status()
         _update_gh_usage() # Increment usage count on successful API call
-        data = response.json()
-
-        if 'paths' in data and data['paths']:
-            path = data['paths'][0]
-            # GraphHopper uses the same polyline encoding
-            decoded_geom = polyline.decode(path['points'])
-            line = LineString([(lon, lat) for lat, lon in decoded_geom])
-
-            instructions = [item['text'] for item in path.get('instructions', [])]
-            
-            details = {
-                'distance': path['distance'], # meters
-                'duration': path['time'] / 1000, # ms to seconds
-                'instructions': instructions
-            }
-            return line, details
-        else:
-            logger.warning(f"GraphHopper API returned no route. Response: {data}")
-            return None, None
+        return _parse_graphhopper_response(orjson.loads(response.content))
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching GraphHopper route: {e}")
         return None, None
 
-def get_osm_route(origin, destination, routing_options=None):
+async def get_graphhopper_route_async(session, origin, destination, routing_options=None, want_instructions=True):
     """
-    Get a route from OSRM API.
+    Async variant of get_graphhopper_route using a shared aiohttp session.
     """
-    logger.debug(f"get_osm_route called with origin: {origin}, destination: {destination}")
-    if routing_options is None:
-        routing_options = {}
+    logger.debug("get_graphhopper_route_async called with origin: %s, destination: %s", origin, destination)
+    params = _build_graphhopper_params(origin, destination, routing_options or {}, want_instructions)
+    if params is None:
+        return None, None
 
+    try:
+        async with session.get(GRAPHHOPPER_ENDPOINT, params=params,
+                               timeout=aiohttp.ClientTimeout(total=15)) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+        _update_gh_usage() # Increment usage count on successful API call
+        return _parse_graphhopper_response(data)
+    except (aiohttp.ClientError, TimeoutError) as e:
+        logger.error(f"Error fetching GraphHopper route: {e}")
+        return None, None
+
+def _build_osrm_request(origin, destination, routing_options, want_instructions=True):
+    """Build the OSRM route URL and its query parameters.
+
+    want_instructions=False drops steps and annotations from the response
+    for callers that only need the geometry.
+    """
     # OSRM doesn't support a 'strategy' parameter, so we remove it if it exists.
     routing_options.pop('strategy', None)
 
     # OSRM expects coordinates as lon,lat
-    origin_str = f'{origin[0]},{origin[1]}'
-    destination_str = f'{destination[0]},{destination[1]}'
-    
-    base_url = f'{OSRM_ENDPOINT}{origin_str};{destination_str}'
-    params = {'overview': 'full', 'geometries': 'polyline', 'steps': 'true', 'annotations': 'true', **routing_options}
-    param_string = '&'.join([f'{k}={v}' for k, v in params.items()])
+    url = f'{OSRM_ENDPOINT}{origin[0]},{origin[1]};{destination[0]},{destination[1]}'
+    # geometries=geojson returns raw (lon, lat) coordinates, skipping the
+    # pure-Python polyline decode on every response
+    detail = 'true' if want_instructions else 'false'
+    params = {'overview': 'full', 'geometries': 'geojson', 'steps': detail, 'annotations': detail, **routing_options}
+    return url, params
 
-    try:
-        response = requests.get(f"{base_url}?{param_string}")
-        response.raise_for_status()
-        data = response.json()
+# OSRM maneuver types are a small fixed enum, so the '_'->' ' + title-case
+# transform is precomputed instead of re-run for every step of every route
+_STEP_LABELS = {t: t.replace('_', ' ').title() for t in (
+    'turn', 'new_name', 'depart', 'arrive', 'merge', 'on_ramp', 'off_ramp',
+    'fork', 'end_of_road', 'continue', 'roundabout', 'rotary',
+    'roundabout_turn', 'exit_roundabout', 'exit_rotary', 'notification',
+    'use_lane')}
 
-        if 'routes' in data and data['routes']:
-            route = data['routes'][0]
-            geom = route['geometry']
-            # OSRM uses polyline encoding with 5 decimal places precision
-            decoded_geom = polyline.decode(geom)
-            # The decoded geometry is a list of (lat, lon) tuples
-            # Convert it to (lon, lat) for shapely
-            line = LineString([(lon, lat) for lat, lon in decoded_geom])
-            
-            instructions = []
-            for leg in route.get('legs', []):
-                for step in leg.get('steps', []):
-                    maneuver = step.get('maneuver', {})
-                    step_type = maneuver.get('type', '')
-                    modifier = maneuver.get('modifier', '')
-                    street_name = step.get('name', '')
-
-                    # Construct a human-readable instruction
-                    if step_type == 'depart':
-                        instruction = f"Head on {street_name}"
-                    else:
-                        instruction = f"{step_type.replace('_', ' ').title()} {modifier} onto {street_name}".strip()
+def _parse_osrm_response(data):
+    """Extract (line, details) from an OSRM route response."""
+    if 'routes' in data and data['routes']:
+        route = data['routes'][0]
+        # With geometries=geojson the geometry is already (lon, lat)
+        # coordinate pairs - no decode, no axis swap
+        coords = np.asarray(route['geometry']['coordinates'], dtype=np.float64)
+        line = shapely.linestrings(coords)
+
+        instructions = []
+        seen = set()
+        for leg in route.get('legs', []):
+            for step in leg.get('steps', []):
+                maneuver = step.get('maneuver', {})
+                step_type = maneuver.get('type', '')
+                modifier = maneuver.get('modifier', '')
+                street_name = step.get('name', '')
+
+                # Construct a human-readable instruction
+                if step_type == 'depart':
+                    instruction = f"Head on {street_name}"
+                else:
+                    label = _STEP_LABELS.get(step_type)
+                    if label is None:
+                        label = step_type.replace('_', ' ').title()
+                    instruction = f"{label} {modifier} onto {street_name}".strip()
+                # De-duplicate as we go, preserving first-seen order
+                if instruction not in seen:
+                    seen.add(instruction)
                     instructions.append(instruction)
 
-            details = {'distance': route['distance'], 'duration': route['duration'], 'instructions': list(dict.fromkeys(instructions))} # Remove duplicates
-            return line, details
+        details = {'distance': route['distance'], 'duration': route['duration'], 'instructions': instructions}
+        return line, details
+    return None, None
+
+def get_osm_route(origin, destination, routing_options=None, want_instructions=True):
+    """
+    Get a route from OSRM API.
+    """
+    logger.debug("get_osm_route called with origin: %s, destination: %s", origin, destination)
+    url, params = _build_osrm_request(origin, destination, routing_options or {}, want_instructions)
+
+    try:
+        response = http_session.get_session().get(url, params=params)
+        response.raise_for_status()
+        return _parse_osrm_response(orjson.loads(response.content))
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching OSRM route: {e}")
         return None, None
 
+async def get_osm_route_async(session, origin, destination, routing_options=None, want_instructions=True):
+    """
+    Async variant of get_osm_route using a shared aiohttp session.
+    """
+    logger.debug("get_osm_route_async called with origin: %s, destination: %s", origin, destination)
+    url, params = _build_osrm_request(origin, destination, routing_options or {}, want_instructions)
+
+    try:
+        async with session.get(url, params=params) as response:
+            response.raise_for_status()
+            data = orjson.loads(await response.read())
+        return _parse_osrm_response(data)
+    except (aiohttp.ClientError, TimeoutError) as e:
+        logger.error(f"Error fetching OSRM route: {e}")
+        return None, None
+
 def snap_to_road_osrm(point):
     """
     Snaps a single point (lon, lat) to the nearest road using the OSRM nearest service.
@@ -166,14 +276,39 @@ def snap_to_road_osrm(point):
     lon, lat = point
     url = f"{OSRM_NEAREST_ENDPOINT}{lon},{lat}"
     try:
-        response = requests.get(url, timeout=5)
+        response = http_session.get_session().get(url, timeout=5)
         response.raise_for_status()
         data = response.json()
         if data.get('code') == 'Ok' and data.get('waypoints'):
             snapped_location = data['waypoints'][0]['location']
-            logger.debug(f"Snapped point {point} to {tuple(snapped_location)}")
+            logger.debug("Snapped point %s to %s", point, tuple(snapped_location))
             return tuple(snapped_location) # returns (lon, lat)
     except requests.exceptions.RequestException as e:
         logger.warning(f"Could not snap point {point} to road: {e}. Using original point.")
     
     return point # Fallback to original point
+
+def snap_points_osrm(points):
+    """
+    Snaps many (lon, lat) points to the road network in a single request.
+    The OSRM route service reports the snapped location of every input
+    waypoint, so one GET replaces a /nearest round-trip per point. Returns
+    the snapped points in input order, or the originals if snapping fails.
+    """
+    points = [tuple(p) for p in points]
+    if len(points) < 2:
+        # The route service needs at least two coordinates
+        return [snap_to_road_osrm(p) for p in points]
+
+    coord_str = ';'.join(f'{lon},{lat}' for lon, lat in points)
+    url = f"{OSRM_ENDPOINT}{coord_str}?overview=false&steps=false&annotations=false"
+    try:
+        response = http_session.get_session().get(url, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        if data.get('code') == 'Ok' and len(data.get('waypoints', [])) == len(points):
+            return [tuple(wp['location']) for wp in data['waypoints']]
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not batch-snap {len(points)} points: {e}. Using original points.")
+
+    return points # Fallback to original points
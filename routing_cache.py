@@ -0,0 +1,98 @@
+import threading
+from collections import OrderedDict
+
+import shapely
+
+# Process-wide memo of provider responses. Repeated comparisons over the same
+# area re-request identical OD pairs - especially after snapping quantizes
+# endpoints onto the road network - and a hit here saves an entire HTTPS
+# round-trip, which dwarfs any in-process optimization.
+#
+# Entries store (WKB bytes, details dict) rather than shapely objects so every
+# hit rebuilds a fresh geometry instead of sharing one across callers.
+
+_MAXSIZE = 4096
+
+# Round to 5 decimal places (~1 m) so float jitter in snapped coordinates
+# does not defeat the cache.
+_COORD_PRECISION = 5
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_enabled = True
+
+
+def set_enabled(enabled):
+    """Enable or disable the cache (``--no-cache`` benchmarking switch)."""
+    global _enabled
+    _enabled = enabled
+
+
+def clear():
+    """Drop all cached responses."""
+    with _lock:
+        _cache.clear()
+
+
+def _make_key(provider, origin, destination, routing_options):
+    return (
+        provider,
+        round(origin[0], _COORD_PRECISION), round(origin[1], _COORD_PRECISION),
+        round(destination[0], _COORD_PRECISION), round(destination[1], _COORD_PRECISION),
+        tuple(sorted((routing_options or {}).items())),
+    )
+
+
+def _get(key):
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+        return hit
+
+
+def _put(key, route, details):
+    with _lock:
+        _cache[key] = (route.wkb if route is not None else None, details)
+        _cache.move_to_end(key)
+        if len(_cache) > _MAXSIZE:
+            _cache.popitem(last=False)
+
+
+def _unpack(entry):
+    wkb, details = entry
+    line = shapely.from_wkb(wkb) if wkb is not None else None
+    # Copy the details so callers that annotate the dict don't poison the cache
+    return line, dict(details) if details is not None else None
+
+
+def fetch_cached(fetch, provider, origin, destination, routing_options=None):
+    """Call ``fetch(origin, destination, routing_options)`` through the cache.
+
+    Failed fetches (route is None) are not cached so transient provider
+    errors don't stick for the lifetime of the process.
+    """
+    if not _enabled:
+        return fetch(origin, destination, routing_options)
+    key = _make_key(provider, origin, destination, routing_options)
+    entry = _get(key)
+    if entry is not None:
+        return _unpack(entry)
+    route, details = fetch(origin, destination, routing_options)
+    if route is not None:
+        _put(key, route, details)
+    return route, details
+
+
+async def fetch_cached_async(fetch, provider, session, origin, destination, routing_options=None):
+    """Async counterpart of fetch_cached for the aiohttp provider clients."""
+    if not _enabled:
+        return await fetch(session, origin, destination, routing_options)
+    key = _make_key(provider, origin, destination, routing_options)
+    entry = _get(key)
+    if entry is not None:
+        return _unpack(entry)
+    route, details = await fetch(session, origin, destination, routing_options)
+    if route is not None:
+        _put(key, route, details)
+    return route, details
@@ -0,0 +1,115 @@
+"""In-process task queue for running route comparisons.
+
+Replaces the old per-request `subprocess.Popen('python -u data_processing.py')`
+hand-off: a persistent worker thread imports the processing code once and jobs
+are dispatched over a queue, so each comparison skips interpreter startup and
+the repeated geopandas/shapely/numpy imports (~500ms-2s per click).
+
+Progress lines that the processing code used to print to stdout are published
+to a per-task message queue which /progress bridges to the SSE stream.
+"""
+import logging
+import queue
+import threading
+import uuid
+
+import data_processing
+from logger_config import JsonFormatter
+
+logger = logging.getLogger(__name__)
+
+
+class Task:
+    """A single comparison job and its progress message channel."""
+
+    def __init__(self, target, args):
+        self.id = uuid.uuid4().hex
+        self.target = target
+        self.args = args
+        # Raw JSON lines for the frontend; a None sentinel marks the end.
+        self.messages = queue.Queue()
+        self.done = threading.Event()
+
+    def publish(self, line):
+        """Publish a progress/result line to this task's message channel."""
+        self.messages.put(line)
+
+
+class _TaskLogHandler(logging.Handler):
+    """Forwards log records emitted during a job to its progress channel."""
+
+    def __init__(self, task):
+        super().__init__()
+        self.task = task
+        self.setFormatter(JsonFormatter())
+
+    def emit(self, record):
+        self.task.publish(self.format(record))
+
+
+_tasks = {}
+_task_queue = queue.Queue()
+_lock = threading.Lock()
+_worker = None
+_current = None
+_latest = None
+
+
+def _worker_loop():
+    """Consume queued tasks one at a time, mirroring the old single-process
+    semantics where only one comparison runs at once."""
+    global _current
+    while True:
+        task = _task_queue.get()
+        _current = task
+        handler = _TaskLogHandler(task)
+        logging.getLogger().addHandler(handler)
+        data_processing.set_progress_sink(task.publish)
+        try:
+            task.target(*task.args)
+        except Exception as e:
+            logger.error(f"Task {task.id} failed: {e}")
+        finally:
+            data_processing.set_progress_sink(None)
+            logging.getLogger().removeHandler(handler)
+            _current = None
+            task.done.set()
+            task.publish(None)  # End-of-stream sentinel for /progress
+
+
+def busy():
+    """Return True if a comparison is currently running or queued."""
+    return _current is not None or not _task_queue.empty()
+
+
+def submit(target, *args):
+    """Queue a comparison job. Returns the Task, or None if one is already
+    in progress (the frontend only supports a single active comparison)."""
+    global _worker, _latest
+    with _lock:
+        if busy():
+            return None
+        # Reap finished tasks so completed Tasks and their message queues
+        # don't accumulate for the life of the process. Late /progress
+        # connects for a reaped id find no task and close immediately,
+        # matching the old stdout-EOF behaviour.
+        for task_id in [tid for tid, t in _tasks.items() if t.done.is_set()]:
+            del _tasks[task_id]
+        if _worker is None:
+            _worker = threading.Thread(target=_worker_loop, name='argus-worker', daemon=True)
+            _worker.start()
+        task = Task(target, args)
+        _tasks[task.id] = task
+        _latest = task
+        _task_queue.put(task)
+        return task
+
+
+def get(task_id):
+    """Look up a task by id."""
+    return _tasks.get(task_id)
+
+
+def latest():
+    """Return the most recently submitted task, if any."""
+    return _latest